@@ -0,0 +1,22 @@
+# Import necessary libraries
+import streamlit as st
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# -----------------------------------------------------------------------------
+# Firebase Connection (Shared by every dashboard page)
+# -----------------------------------------------------------------------------
+@st.cache_resource
+def get_db():
+    """
+    Initializes the Firebase app from Streamlit secrets (once per process)
+    and returns the Firestore client.
+    """
+    if not firebase_admin._apps:
+        secrets_dict = st.secrets["firebase_key"]
+        firebase_creds_copy = dict(secrets_dict)
+        firebase_creds_copy['private_key'] = firebase_creds_copy['private_key'].replace('\\n', '\n')
+        cred = credentials.Certificate(firebase_creds_copy)
+        firebase_admin.initialize_app(cred)
+
+    return firestore.client()
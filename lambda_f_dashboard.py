@@ -2,9 +2,19 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import firebase_admin
-from firebase_admin import credentials, firestore
 from datetime import datetime
+import threading
+import time
+from firebase_client import get_db
+from lambda_f_data import (
+    CRITICAL_LEVEL,
+    HISTORY_FIELDS,
+    HISTORY_LIMIT,
+    RISK_LEVEL,
+    history_cache_key,
+    merge_history,
+    query_lambda_f_records,
+)
 
 # -----------------------------------------------------------------------------
 # Page Configuration (Called only once at the beginning of the script)
@@ -19,60 +29,83 @@ st.set_page_config(
 # -----------------------------------------------------------------------------
 # Firebase Connection (Using Streamlit's caching mechanism)
 # -----------------------------------------------------------------------------
-if not firebase_admin._apps:
-    secrets_dict = st.secrets["firebase_key"]
-    firebase_creds_copy = dict(secrets_dict)
-    firebase_creds_copy['private_key'] = firebase_creds_copy['private_key'].replace('\\n', '\n')
-    cred = credentials.Certificate(firebase_creds_copy)
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+db = get_db()
 
 # -----------------------------------------------------------------------------
 # Data Fetching Function
 # -----------------------------------------------------------------------------
-@st.cache_data(ttl=600)  # Cache the data for 10 minutes (600 seconds)
-def fetch_lambda_f_data(_db_client):
+REFRESH_INTERVAL = 600  # Look for new records every 10 minutes (600 seconds)
+
+@st.cache_resource
+def get_history_cache():
+    """
+    Returns the process-wide cache holding the sorted history DataFrame.
+    The 'cursor' is the snapshot of the newest document already fetched, so
+    later refreshes only read documents written after it.
     """
-    Fetches Lambda-F data from Firestore, converts it to a DataFrame, and sorts it.
-    The _db_client parameter helps the cache know when to invalidate.
+    return {
+        "df": pd.DataFrame(),
+        "cursor": None,
+        "fetched_at": 0.0,
+        "lock": threading.Lock(),
+    }
+
+def fetch_lambda_f_data(db_client, limit=HISTORY_LIMIT, reload=False):
     """
-    if _db_client is None:
+    Fetches Lambda-F data from Firestore and returns the last `limit` records
+    sorted by time. The first call reads the full window; subsequent refreshes
+    only read documents after the cached cursor snapshot and append them.
+    With reload=True the cache is dropped and the full window is read again.
+    """
+    if db_client is None:
         return pd.DataFrame() # Return an empty DataFrame
-        
-    try:
-        # Fetch the last 30 records in descending order to get the most recent ones
-        docs = _db_client.collection("lambdaF").order_by("timestamp", direction=firestore.Query.DESCENDING).limit(30).stream()
-        
-        data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            data.append({
-                "timestamp": doc_data.get("timestamp"),
-                "lambda_F": doc_data.get("lambda_F"),
-                "status": doc_data.get("status", "N/A")
-            })
-        
-        if not data:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data)
-        df = df.dropna(subset=['timestamp', 'lambda_F'])
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        # Sort values ascending to plot correctly
-        df = df.sort_values(by="timestamp", ascending=True).reset_index(drop=True)
-        return df
-
-    except Exception as e:
-        st.error(f"An error occurred while fetching data: {e}")
-        return pd.DataFrame()
+
+    cache = get_history_cache()
+    with cache["lock"]:
+        if not reload and time.time() - cache["fetched_at"] < REFRESH_INTERVAL:
+            return cache["df"]
+
+        try:
+            # A reload starts over so edited or deleted documents are picked up
+            df = pd.DataFrame() if reload else cache["df"]
+            cursor = None if reload else cache["cursor"]
+            docs = query_lambda_f_records(db_client, limit, start_after=cursor)
+            if cursor is not None and len(docs) >= limit:
+                # At least a full window of new records; just read the newest window
+                df = pd.DataFrame()
+                docs = query_lambda_f_records(db_client, limit)
+            cache["fetched_at"] = time.time()
+            if not docs:
+                cache["df"] = df
+                cache["cursor"] = cursor
+                return df
+
+            df = merge_history(df, docs, limit)
+            cache["df"] = df
+            cache["cursor"] = docs[-1]
+            return df
+
+        except Exception as e:
+            st.error(f"An error occurred while fetching data: {e}")
+            return cache["df"]
 
 # -----------------------------------------------------------------------------
 # Visualization Functions
 # -----------------------------------------------------------------------------
+# Threshold lines drawn on the chart: (level, color, label)
+THRESHOLD_LINES = [
+    (CRITICAL_LEVEL, "red", "🚨 Critical Level (0.7)"),
+    (RISK_LEVEL, "orange", "⚠️ Risk Level (0.5)"),
+]
+# Marker color for each severity level
+SEVERITY_COLORS = {0: "green", 1: "orange", 2: "red"}
+
+@st.cache_resource(ttl=REFRESH_INTERVAL, hash_funcs={pd.DataFrame: history_cache_key})
 def create_time_series_chart(df):
     """
     Creates an interactive time series chart with the given DataFrame.
+    The figure object itself is memoized, so reruns with unchanged data reuse
+    it without rebuilding or unpickling a copy.
     """
     if df.empty:
         return None
@@ -85,19 +118,29 @@ def create_time_series_chart(df):
         labels={'timestamp': 'Date', 'lambda_F': 'λF Score'},
         markers=True
     )
-
-    # Chart styling and threshold lines
+    # Color each point by its severity while keeping a single continuous line
+    fig.update_traces(marker=dict(color=df["severity"].map(SEVERITY_COLORS).tolist()))
+
+    # Threshold lines spanning the full width, labelled at the bottom right
+    shapes = [
+        dict(type="line", xref="paper", x0=0, x1=1, yref="y", y0=level, y1=level, line=dict(dash="dot", color=color))
+        for level, color, _ in THRESHOLD_LINES
+    ]
+    annotations = [
+        dict(text=label, xref="paper", x=1, xanchor="right", yref="y", y=level, yanchor="top", showarrow=False)
+        for level, _, label in THRESHOLD_LINES
+    ]
+
+    # Chart styling and threshold lines in a single layout update
     fig.update_layout(
         xaxis_title="Time",
         yaxis_title="λF Score",
         yaxis_range=[0, 1],
         template="plotly_white", # For a cleaner look
-        title_x=0.5 # Center the title
+        title_x=0.5, # Center the title
+        shapes=shapes,
+        annotations=annotations
     )
-    
-    # Threshold lines
-    fig.add_hline(y=0.7, line_dash="dot", line_color="red", annotation_text="🚨 Critical Level (0.7)", annotation_position="bottom right")
-    fig.add_hline(y=0.5, line_dash="dot", line_color="orange", annotation_text="⚠️ Risk Level (0.5)", annotation_position="bottom right")
 
     return fig
 
@@ -105,74 +148,95 @@ def create_time_series_chart(df):
 # Main Dashboard Interface
 # -----------------------------------------------------------------------------
 
-# --- Title ---
-st.title("🔺 λF Risk Dashboard")
-st.caption(f"Flux Finance | Data last updated on {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+# Status badge for each severity level: (Streamlit element, message)
+_STATUS_RENDER = {
+    2: ("error", "**Status: Critical** 🚨"),
+    1: ("warning", "**Status: Risky** ⚠️"),
+    0: ("success", "**Status: Normal** ✅"),
+}
 
-# --- Fetch Data ---
-df_history = fetch_lambda_f_data(db)
+@st.fragment
+def render_dashboard(db_client):
+    """
+    Fetches the history and renders the metrics, the tabbed chart/table area
+    and the refresh button. Runs as a fragment, so pressing refresh reruns
+    only this block instead of the whole script.
+    """
+    # --- Fetch Data ---
+    df = fetch_lambda_f_data(db_client, reload=st.session_state.pop("reload_history", False))
+    st.caption(f"Flux Finance | Data last updated on {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+    # --- Main Metrics ---
+    if not df.empty:
+        # Get the latest data, reading only the two values we need
+        lambda_f_values = df['lambda_F'].to_numpy()[-2:]
+        lambda_f_current = lambda_f_values[-1]
+        severity_current = df['severity'].iat[-1]
+
+        # Get the previous data point for comparison (if it exists)
+        lambda_f_previous = lambda_f_values[0] if lambda_f_values.size > 1 else 0
+        delta = lambda_f_current - lambda_f_previous
+
+        st.markdown("---")
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.metric(
+                label="Current λF Score",
+                value=f"{lambda_f_current:.3f}",
+                delta=f"{delta:.3f} vs. previous day",
+                delta_color="inverse" # Positive change is red (bad), negative is green (good)
+            )
+    
+        with col2:
+            # Display a colored status text with an icon
+            kind, message = _STATUS_RENDER[severity_current]
+            getattr(st, kind)(message)
+        st.markdown("---")
 
-# --- Main Metrics ---
-if not df_history.empty:
-    # Get the latest data
-    latest_data = df_history.iloc[-1]
-    lambda_f_current = latest_data['lambda_F']
-    status_current = latest_data['status']
+    else:
+        st.warning("No historical data available to display yet. Please ensure the simulation is generating data.")
 
-    # Get the previous data point for comparison (if it exists)
-    lambda_f_previous = df_history.iloc[-2]['lambda_F'] if len(df_history) > 1 else 0
-    delta = lambda_f_current - lambda_f_previous
 
-    st.markdown("---")
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.metric(
-            label="Current λF Score",
-            value=f"{lambda_f_current:.3f}",
-            delta=f"{delta:.3f} vs. previous day",
-            delta_color="inverse" # Positive change is red (bad), negative is green (good)
-        )
+    # --- Tabbed Content Area ---
+    tab1, tab2 = st.tabs(["📈 Time Series Chart", "📄 Data Table"])
+
+    with tab1:
+        st.subheader("Interactive Chart of λF Scores")
     
-    with col2:
-        # Display a colored status text with an icon
-        if status_current == "Kritik" or status_current == "Critical":
-            st.error(f"**Status: Critical** 🚨")
-        elif status_current == "Riskli" or status_current == "Risky":
-            st.warning(f"**Status: Risky** ⚠️")
+        # Create and display the chart
+        time_series_chart = create_time_series_chart(df)
+        if time_series_chart:
+            st.plotly_chart(time_series_chart, use_container_width=True)
         else:
-            st.success(f"**Status: Normal** ✅")
-    st.markdown("---")
+            st.info("Not enough data to draw the chart.")
 
-else:
-    st.warning("No historical data available to display yet. Please ensure the simulation is generating data.")
+    with tab2:
+        st.subheader("Historical λF Data (Last 30 records)")
+    
+        if not df.empty:
+            # Display the newest records first; the history is already sorted ascending
+            st.dataframe(
+                df.iloc[::-1],
+                column_order=HISTORY_FIELDS,
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No data table to display.")
 
+    # --- Refresh ---
+    if st.button('Refresh Data 🔄'):
+        # Drop the cached history and rerun only this fragment to read it again
+        st.session_state["reload_history"] = True
+        st.rerun(scope="fragment")
 
-# --- Tabbed Content Area ---
-tab1, tab2 = st.tabs(["📈 Time Series Chart", "📄 Data Table"])
 
-with tab1:
-    st.subheader("Interactive Chart of λF Scores")
-    
-    # Create and display the chart
-    time_series_chart = create_time_series_chart(df_history)
-    if time_series_chart:
-        st.plotly_chart(time_series_chart, use_container_width=True)
-    else:
-        st.info("Not enough data to draw the chart.")
+# --- Title ---
+st.title("🔺 λF Risk Dashboard")
 
-with tab2:
-    st.subheader("Historical λF Data (Last 30 records)")
-    
-    if not df_history.empty:
-        # Display the DataFrame in a more readable format
-        st.dataframe(
-            df_history.sort_values(by="timestamp", ascending=False),
-            use_container_width=True,
-            hide_index=True
-        )
-    else:
-        st.info("No data table to display.")
+# --- Data Panel ---
+render_dashboard(db)
 
 
 # --- Sidebar ---
@@ -188,8 +252,3 @@ st.sidebar.info(
     - **0.7 - 1.0 (Critical 🚨):** Social tension is high, increasing the risk of sudden and large price movements.
     """
 )
-st.sidebar.markdown("---")
-if st.sidebar.button('Refresh Data 🔄'):
-    # Clear the cache and rerun the script to fetch new data
-    st.cache_data.clear()
-    st.rerun()
@@ -0,0 +1,91 @@
+# Import necessary libraries
+import pandas as pd
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# History Settings
+# -----------------------------------------------------------------------------
+HISTORY_LIMIT = 30  # Number of most recent records kept on the dashboard
+HISTORY_FIELDS = ["timestamp", "lambda_F", "status"]  # The only fields the dashboard reads
+HISTORY_COLUMNS = ["doc_id"] + HISTORY_FIELDS  # Document id is kept to merge refreshes
+CRITICAL_LEVEL = 0.7  # λF at or above this is Critical
+RISK_LEVEL = 0.5  # λF at or above this (and below CRITICAL_LEVEL) is Risky
+# Known status labels (Turkish and English); "N/A" marks a missing status
+STATUS_LABELS = ["Normal", "Kritik", "Riskli", "Critical", "Risky", "N/A"]
+
+# -----------------------------------------------------------------------------
+# Firestore Queries
+# -----------------------------------------------------------------------------
+def query_lambda_f_records(db_client, limit, start_after=None):
+    """
+    Returns Lambda-F document snapshots in ascending time order.
+    Without a cursor this is the newest `limit` documents. When `start_after`
+    is a DocumentSnapshot, it is the first `limit` documents ordered after it.
+    """
+    # Ask Firestore to send only the fields we actually use
+    query = db_client.collection("lambdaF").select(HISTORY_FIELDS).order_by("timestamp")
+    if start_after is None:
+        # Sliding window of the newest records; get() returns them ascending
+        return query.limit_to_last(limit).get()
+    # limit_to_last flips the sort but not the cursor, so deltas use a plain limit
+    return query.start_after(start_after).limit(limit).get()
+
+# -----------------------------------------------------------------------------
+# DataFrame Conversion
+# -----------------------------------------------------------------------------
+def status_dtype(labels):
+    """
+    Returns a categorical dtype covering the known status labels plus any
+    other labels present in `labels`, so unexpected statuses are kept as-is.
+    """
+    extra = sorted(set(labels) - set(STATUS_LABELS), key=str)
+    return pd.CategoricalDtype(STATUS_LABELS + extra)
+
+def records_to_dataframe(records):
+    """
+    Converts a list of Firestore document dicts (with their "doc_id") to a
+    DataFrame sorted by time.
+    """
+    if not records:
+        return pd.DataFrame()
+
+    # Build the DataFrame in one call; missing fields become NaN
+    df = pd.DataFrame.from_records(records).reindex(columns=HISTORY_COLUMNS)
+    df["lambda_F"] = df["lambda_F"].astype("float64")
+    # Firestore already returns UTC datetimes; unparseable values become NaT and are dropped
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+    df = df.dropna(subset=['timestamp', 'lambda_F'])
+    # Severity per record in one pass: 0 = Normal, 1 = Risky, 2 = Critical.
+    # Computed on the float64 source values so float32 rounding can't cross a threshold.
+    lambda_f = df["lambda_F"].to_numpy()
+    df["severity"] = np.select([lambda_f >= CRITICAL_LEVEL, lambda_f >= RISK_LEVEL], [2, 1], default=0).astype(np.int8)
+    # Set the dtypes explicitly instead of relying on pandas' inference; the
+    # pyarrow-backed score column is handed to st.dataframe without conversion
+    df["lambda_F"] = df["lambda_F"].astype("float32[pyarrow]")
+    status = df["status"].fillna("N/A")
+    df["status"] = status.astype(status_dtype(status.unique()))
+    # Sort values ascending to plot correctly
+    return df.sort_values(by="timestamp", ascending=True).reset_index(drop=True)
+
+def merge_history(df, docs, limit=HISTORY_LIMIT):
+    """
+    Appends newly fetched document snapshots to the history DataFrame and
+    keeps the last `limit` records sorted by time. A document read again
+    replaces its earlier row instead of being repeated.
+    """
+    new_df = records_to_dataframe([{**doc.to_dict(), "doc_id": doc.id} for doc in docs])
+    if not df.empty:
+        new_df = pd.concat([df, new_df], ignore_index=True).drop_duplicates(subset="doc_id", keep="last")
+        # Batches may carry different status categories; merge them into one dtype
+        new_df["status"] = new_df["status"].astype(status_dtype(new_df["status"].unique()))
+    return new_df.sort_values(by="timestamp", ascending=True).tail(limit).reset_index(drop=True)
+
+def history_cache_key(df):
+    """
+    Cache key for the history DataFrame, built from the columns the chart
+    draws. A reload can edit or delete any row, not just the newest one, so
+    every row is hashed; at HISTORY_LIMIT rows this is still cheap.
+    """
+    if df.empty:
+        return 0
+    return int(pd.util.hash_pandas_object(df[["doc_id", "timestamp", "lambda_F"]], index=False).sum())
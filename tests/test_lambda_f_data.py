@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from lambda_f_data import history_cache_key, merge_history, query_lambda_f_records
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSnapshot:
+    def __init__(self, n):
+        self.id = f"doc{n:03d}"
+        self._data = {
+            "timestamp": START + timedelta(hours=n),
+            "lambda_F": n / 100,
+            "status": "Normal",
+        }
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """Minimal in-memory stand-in for a Firestore query ordered by timestamp."""
+
+    def __init__(self, docs, start_after=None, limit=None, limit_to_last=None):
+        self._docs = docs
+        self._start_after = start_after
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+
+    def _with(self, **changes):
+        args = dict(start_after=self._start_after, limit=self._limit, limit_to_last=self._limit_to_last)
+        args.update(changes)
+        return FakeQuery(self._docs, **args)
+
+    def select(self, fields):
+        return self
+
+    def order_by(self, field):
+        assert field == "timestamp"
+        return self
+
+    def start_after(self, snapshot):
+        return self._with(start_after=snapshot)
+
+    def limit(self, count):
+        return self._with(limit=count, limit_to_last=None)
+
+    def limit_to_last(self, count):
+        assert self._start_after is None, "limit_to_last with a cursor reads older documents"
+        return self._with(limit_to_last=count, limit=None)
+
+    def get(self):
+        key = lambda doc: (doc.to_dict()["timestamp"], doc.id)
+        docs = sorted(self._docs, key=key)
+        if self._start_after is not None:
+            docs = [doc for doc in docs if key(doc) > key(self._start_after)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        if self._limit_to_last is not None:
+            docs = docs[-self._limit_to_last:]
+        return docs
+
+
+class FakeClient:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        assert name == "lambdaF"
+        return FakeQuery(self.docs)
+
+
+def test_initial_query_returns_newest_window_ascending():
+    client = FakeClient([FakeSnapshot(n) for n in range(1, 41)])
+
+    docs = query_lambda_f_records(client, 30)
+
+    assert [doc.id for doc in docs] == [f"doc{n:03d}" for n in range(11, 41)]
+
+
+def test_refresh_appends_new_document():
+    client = FakeClient([FakeSnapshot(n) for n in range(1, 41)])
+    docs = query_lambda_f_records(client, 30)
+    df = merge_history(pd.DataFrame(), docs, 30)
+    cursor = docs[-1]
+
+    client.docs.append(FakeSnapshot(41))
+    new_docs = query_lambda_f_records(client, 30, start_after=cursor)
+    df = merge_history(df, new_docs, 30)
+
+    assert [doc.id for doc in new_docs] == ["doc041"]
+    assert len(df) == 30
+    assert df["timestamp"].is_unique
+    assert df["timestamp"].iloc[0] == START + timedelta(hours=12)
+    assert df["timestamp"].iloc[-1] == START + timedelta(hours=41)
+
+
+def test_merge_replaces_documents_read_again():
+    docs = [FakeSnapshot(n) for n in range(1, 6)]
+    df = merge_history(pd.DataFrame(), docs, 30)
+
+    edited = FakeSnapshot(5)
+    edited._data["status"] = "Risky"
+    df = merge_history(df, docs[3:4] + [edited], 30)
+
+    assert df["doc_id"].tolist() == [f"doc{n:03d}" for n in range(1, 6)]
+    assert df["status"].iloc[-1] == "Risky"
+
+
+def test_severity_uses_unrounded_scores():
+    snapshot = FakeSnapshot(1)
+    snapshot._data.update(lambda_F=0.69999999, status="Risky")
+
+    df = merge_history(pd.DataFrame(), [snapshot], 30)
+
+    assert df["severity"].iat[-1] == 1
+
+
+def test_unknown_status_labels_are_kept():
+    first, second, third = FakeSnapshot(1), FakeSnapshot(2), FakeSnapshot(3)
+    first._data["status"] = "Weird"
+    del second._data["status"]
+    third._data["status"] = "Other"
+
+    df = merge_history(pd.DataFrame(), [first, second], 30)
+    df = merge_history(df, [third], 30)
+
+    assert df["status"].tolist() == ["Weird", "N/A", "Other"]
+    assert isinstance(df["status"].dtype, pd.CategoricalDtype)
+
+
+def test_cache_key_changes_after_reload_with_middle_edit_or_delete():
+    client = FakeClient([FakeSnapshot(n) for n in range(1, 41)])
+    key = history_cache_key(merge_history(pd.DataFrame(), query_lambda_f_records(client, 30), 30))
+
+    client.docs = [doc for doc in client.docs if doc.id != "doc020"]
+    client.docs[20]._data["lambda_F"] = 0.99
+    reloaded = merge_history(pd.DataFrame(), query_lambda_f_records(client, 30), 30)
+
+    assert len(reloaded) == 30
+    assert history_cache_key(reloaded) != key
+
+    client.docs[20]._data["lambda_F"] = 0.22
+    edited_only = merge_history(pd.DataFrame(), query_lambda_f_records(client, 30), 30)
+    assert history_cache_key(edited_only) != history_cache_key(reloaded)